@@ -0,0 +1,465 @@
+"""
+Load-test and benchmark harness for the attendance backend.
+
+Seeds users, classes and enrollments, then drives the HTTP routes and a full
+/ws attendance session with many concurrent clients. Latency percentiles and
+throughput are printed as JSON so runs can be compared across commits.
+
+By default the server runs in a separate process against a mongomock
+database, so it does not share a GIL with the load generator:
+
+    python bench.py --output bench.json
+
+To benchmark against a local mongod instead (the attendence_db collections
+on that server are wiped before seeding):
+
+    python bench.py --db-url mongodb://localhost:27017
+
+Add --url (together with --db-url) to hit an already running server that
+uses the same database.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from urllib.parse import urlparse
+
+import bcrypt
+import httpx
+import websockets
+
+PASSWORD = "benchpass"
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+VERSIONED_PACKAGES = ("fastapi", "starlette", "uvicorn", "pymongo", "bcrypt", "httpx", "websockets", "mongomock")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the attendance backend")
+    parser.add_argument("--db-url", help="MongoDB URL of a local mongod (default: in-memory mongomock)")
+    parser.add_argument("--allow-remote-db", action="store_true", help="Allow --db-url to point at a non-local host")
+    parser.add_argument("--url", help="Base URL of a running server that uses --db-url (default: start one)")
+    parser.add_argument("--teachers", type=int, default=10)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--classes", type=int, default=20)
+    parser.add_argument("--students-per-class", type=int, default=30)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="Cost used for seeded password hashes")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per HTTP endpoint")
+    parser.add_argument("--login-requests", type=int, default=50, help="Requests for /login (bcrypt bound)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent HTTP clients")
+    parser.add_argument("--ws-clients", type=int, default=50, help="Student sockets listening during a session")
+    parser.add_argument("--ws-sessions", type=int, default=3, help="Sessions run back to back")
+    parser.add_argument("--marks", type=int, default=None, help="Marks per session, at most students per class (default: all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    # Internal: set when bench.py re-runs itself as the server process
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--seeded-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.url and not args.db_url:
+        parser.error("--url needs --db-url so the benchmark can seed the database that server uses")
+    if args.students < 1 or args.teachers < 1 or args.classes < 1:
+        parser.error("--teachers, --students and --classes must be at least 1")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    for name in ("requests", "login_requests", "ws_clients", "ws_sessions", "marks"):
+        if (getattr(args, name) or 0) < 0:
+            parser.error(f"--{name.replace('_', '-')} cannot be negative")
+    return args
+
+
+def connect_db(args):
+    """Point main.py at the benchmark database and import it"""
+    if args.db_url:
+        host = urlparse(args.db_url).hostname
+        if host not in LOCAL_HOSTS and not args.allow_remote_db:
+            sys.exit(f"Refusing to wipe a non-local database ({host}); pass --allow-remote-db to override")
+        os.environ["DB_URL"] = args.db_url
+    else:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import main
+    return main
+
+
+def seed(main, args):
+    """Create teachers, students and classes with deterministic enrollments"""
+    rng = random.Random(args.seed)
+
+    for collection in (main.users, main.classes, main.attendance_records, main.session_checkpoints):
+        collection.delete_many({})
+
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=args.bcrypt_rounds))
+    teachers = [
+        {"name": f"Teacher {i}", "email": f"teacher{i}@example.com", "password": hashed, "role": "teacher"}
+        for i in range(args.teachers)
+    ]
+    students = [
+        {"name": f"Student {i}", "email": f"student{i}@example.com", "password": hashed, "role": "student"}
+        for i in range(args.students)
+    ]
+    teacher_ids = main.users.insert_many(teachers).inserted_ids
+    student_ids = main.users.insert_many(students).inserted_ids
+
+    per_class = min(args.students_per_class, len(student_ids))
+    classes = [
+        {
+            "className": f"Class {i}",
+            "teacherId": teacher_ids[i % len(teacher_ids)],
+            "studentIds": rng.sample(student_ids, per_class)
+        }
+        for i in range(args.classes)
+    ]
+    class_ids = main.classes.insert_many(classes).inserted_ids
+
+    return {
+        "teachers": [t["email"] for t in teachers],
+        "students": [s["email"] for s in students],
+        "classes": [
+            {
+                "_id": str(class_id),
+                "teacher": teachers[i % len(teachers)]["email"],
+                "studentIds": [str(sid) for sid in classes[i]["studentIds"]]
+            }
+            for i, class_id in enumerate(class_ids)
+        ]
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "max_ms": ms(values[-1]) if values else None,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed > 0 else None
+    }
+
+
+async def login_all(client, emails, concurrency):
+    """Log in every user in emails and return {email: token}"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(email):
+        async with semaphore:
+            res = await client.post("/login", json={"email": email, "password": PASSWORD})
+            res.raise_for_status()
+            return email, res.json()["token"]
+
+    return dict(await asyncio.gather(*(login(email) for email in emails)))
+
+
+async def run_http(client, total, concurrency, make_request):
+    """Issue total requests from concurrency workers and summarize latencies"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, kwargs = make_request(i)
+            start = time.perf_counter()
+            try:
+                res = await client.request(method, path, **kwargs)
+                elapsed = time.perf_counter() - start
+                if res.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def listen(ws_url, token, ready, arrivals):
+    """Student socket that records when each ATTENDANCE_MARKED broadcast lands"""
+    async with websockets.connect(f"{ws_url}?token={token}", max_queue=None) as ws:
+        ready.set()
+        async for raw in ws:
+            message = json.loads(raw)
+            if message["event"] == "ATTENDANCE_MARKED":
+                arrivals.setdefault(message["data"]["studentId"], []).append(time.perf_counter())
+            elif message["event"] == "DONE":
+                return
+
+
+async def wait_for(ws, event, student_id=None):
+    """Read the teacher socket until the matching broadcast arrives"""
+    while True:
+        message = json.loads(await ws.recv())
+        if message["event"] == "ERROR":
+            raise RuntimeError(message["data"]["message"])
+        if message["event"] != event:
+            continue
+        if student_id is None or message["data"].get("studentId") == student_id:
+            return message
+
+
+async def run_ws_session(client, ws_url, class_info, teacher_token, listener_tokens, marks, results):
+    """Run start -> marks -> TODAY_SUMMARY -> DONE with listeners attached"""
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+
+    start = time.perf_counter()
+    res = await client.post("/attendance/start", json={"classId": class_info["_id"]}, headers=headers)
+    res.raise_for_status()
+    results["ws_start"].append(time.perf_counter() - start)
+
+    arrivals = [{} for _ in listener_tokens]
+    readies = [asyncio.Event() for _ in listener_tokens]
+    connect_start = time.perf_counter()
+    listeners = [
+        asyncio.create_task(listen(ws_url, token, ready, arrival))
+        for token, ready, arrival in zip(listener_tokens, readies, arrivals)
+    ]
+
+    async with websockets.connect(f"{ws_url}?token={teacher_token}", max_queue=None) as ws:
+        await asyncio.gather(*(ready.wait() for ready in readies))
+        results["ws_connect_all"].append(time.perf_counter() - connect_start)
+
+        # Each student is marked once so fan-out can be matched per mark
+        enrolled = class_info["studentIds"]
+        sent = {}
+        for i in range(marks):
+            student_id = enrolled[i]
+            status = "present" if i % 3 else "absent"
+            sent[student_id] = time.perf_counter()
+            await ws.send(json.dumps({"event": "ATTENDANCE_MARKED", "data": {"studentId": student_id, "status": status}}))
+            await wait_for(ws, "ATTENDANCE_MARKED", student_id)
+            results["ws_mark"].append(time.perf_counter() - sent[student_id])
+
+        start = time.perf_counter()
+        await ws.send(json.dumps({"event": "TODAY_SUMMARY"}))
+        await wait_for(ws, "TODAY_SUMMARY")
+        results["ws_summary"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await ws.send(json.dumps({"event": "DONE"}))
+        await wait_for(ws, "DONE")
+        results["ws_done"].append(time.perf_counter() - start)
+
+    await asyncio.gather(*listeners)
+
+    # Time from the teacher sending a mark until the last listener received it
+    if not arrivals:
+        return
+    for student_id, sent_at in sent.items():
+        received = [arrival[student_id][0] for arrival in arrivals if student_id in arrival]
+        if len(received) == len(arrivals):
+            results["ws_fanout"].append(max(received) - sent_at)
+        else:
+            results["ws_fanout_missed"] += 1
+
+
+async def run_ws(client, ws_url, seeded, tokens, args):
+    class_info = seeded["classes"][0]
+    teacher_token = tokens[class_info["teacher"]]
+    listener_tokens = [tokens[email] for email in seeded["students"][:args.ws_clients]]
+    marks = min(args.marks if args.marks is not None else len(class_info["studentIds"]), len(class_info["studentIds"]))
+
+    results = {name: [] for name in ("ws_start", "ws_connect_all", "ws_mark", "ws_summary", "ws_done", "ws_fanout")}
+    results["ws_fanout_missed"] = 0
+    start = time.perf_counter()
+    for _ in range(args.ws_sessions):
+        await run_ws_session(client, ws_url, class_info, teacher_token, listener_tokens, marks, results)
+    elapsed = time.perf_counter() - start
+
+    # Only marks are steady-state work; per-session events get no throughput
+    report = {
+        name: summarize(values, 0, elapsed if name in ("ws_mark", "ws_fanout") else 0)
+        for name, values in results.items() if name != "ws_fanout_missed"
+    }
+    report["ws_fanout"]["errors"] = results["ws_fanout_missed"]
+    report["ws_session"] = {
+        "sessions": args.ws_sessions,
+        "marks_per_session": marks,
+        "listeners": len(listener_tokens),
+        "total_s": round(elapsed, 3),
+        "marks_per_s": round(args.ws_sessions * marks / elapsed, 2) if elapsed > 0 else None
+    }
+    return report
+
+
+async def run_benchmarks(base_url, seeded, args):
+    ws_url = base_url.replace("http", "ws", 1) + "/ws"
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        listener_emails = seeded["students"][:args.ws_clients]
+        token_emails = list(dict.fromkeys(seeded["teachers"] + listener_emails))
+        tokens = await login_all(client, token_emails, args.concurrency)
+
+        teacher_tokens = [tokens[email] for email in seeded["teachers"]]
+        student_tokens = [tokens[email] for email in listener_emails] or teacher_tokens
+        all_emails = seeded["teachers"] + seeded["students"]
+        auth = lambda token: {"headers": {"Authorization": f"Bearer {token}"}}
+        login_emails = [rng.choice(all_emails) for _ in range(args.login_requests)]
+        class_picks = [rng.choice(seeded["classes"]) for _ in range(args.requests)]
+
+        results = {}
+        results["login"] = await run_http(
+            client, args.login_requests, args.concurrency,
+            lambda i: ("POST", "/login", {"json": {"email": login_emails[i], "password": PASSWORD}})
+        )
+        results["me"] = await run_http(
+            client, args.requests, args.concurrency,
+            lambda i: ("GET", "/me", auth(student_tokens[i % len(student_tokens)]))
+        )
+        results["class"] = await run_http(
+            client, args.requests, args.concurrency,
+            lambda i: ("GET", f"/class/{class_picks[i]['_id']}", auth(tokens[class_picks[i]["teacher"]]))
+        )
+        results["students"] = await run_http(
+            client, args.requests, args.concurrency,
+            lambda i: ("GET", "/students", auth(teacher_tokens[i % len(teacher_tokens)]))
+        )
+        results.update(await run_ws(client, ws_url, seeded, tokens, args))
+        return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_server(args):
+    """Server process: seed the database, then serve until terminated"""
+    import uvicorn
+
+    app_module = connect_db(args)
+    seeded = seed(app_module, args)
+    tmp_file = args.seeded_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(seeded, f)
+    os.replace(tmp_file, args.seeded_file)
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.serve_port, log_level="warning")
+
+
+@contextlib.contextmanager
+def serve():
+    """Start bench.py as a separate server process and yield (base_url, seeded)"""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        seeded_file = os.path.join(tmp_dir, "seeded.json")
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+             "--serve-port", str(port), "--seeded-file", seeded_file],
+            stdout=sys.stderr
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server process exited with code {proc.returncode}")
+                if os.path.exists(seeded_file):
+                    try:
+                        httpx.get(base_url + "/", timeout=1)
+                        break
+                    except httpx.TransportError:
+                        pass
+                time.sleep(0.1)
+            with open(seeded_file) as f:
+                seeded = json.load(f)
+            yield base_url, seeded
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def package_versions():
+    versions = {}
+    for name in VERSIONED_PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def main():
+    args = parse_args()
+    if args.serve_port:
+        run_server(args)
+        return
+
+    # The app prints to stdout; keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.url:
+            seeded = seed(connect_db(args), args)
+            started = time.perf_counter()
+            results = asyncio.run(run_benchmarks(args.url.rstrip("/"), seeded, args))
+        else:
+            with serve() as (base_url, seeded):
+                started = time.perf_counter()
+                results = asyncio.run(run_benchmarks(base_url, seeded, args))
+        duration = time.perf_counter() - started
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "packages": package_versions(),
+        "backend": "mongod" if args.db_url else "mongomock",
+        "server": "external" if args.url else "subprocess",
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "db_url", "url", "serve_port", "seeded_file")
+        },
+        "duration_s": round(duration, 3),
+        "results": results
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 from fastapi import FastAPI,HTTPException,Depends,Header,WebSocket,WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List
+from contextlib import asynccontextmanager
+import asyncio
 import json
 from model import signupreq,userloginres,userlogin,CreateClassRequest,AddStudentRequest,attendancestartReq
-from pymongo import MongoClient
+from pymongo import MongoClient,ReturnDocument
+from pymongo.errors import ConnectionFailure
 from bson import ObjectId
 import os
+import socket
 from dotenv import load_dotenv
 import bcrypt
 import jwt
@@ -19,6 +23,7 @@ db=client["attendence_db"]
 users=db["users"]
 classes=db["classes"]
 attendance_records=db["attendance"]
+session_checkpoints=db["active_sessions"]
 
 # Global in-memory state for active attendance session
 activeSession = None
@@ -26,6 +31,22 @@ activeSession = None
 # Store all active WebSocket connections
 active_connections: List[WebSocket] = []
 
+# Write-behind checkpointing of the active session: marks are buffered here
+# and flushed to MongoDB every CHECKPOINT_BATCH_SIZE marks or every
+# CHECKPOINT_INTERVAL_MS milliseconds, whichever comes first
+CHECKPOINT_BATCH_SIZE = max(1, int(os.getenv("CHECKPOINT_BATCH_SIZE", "20")))
+CHECKPOINT_INTERVAL_MS = max(100, int(os.getenv("CHECKPOINT_INTERVAL_MS", "1000")))
+pending_marks = {}
+checkpoint_lock = asyncio.Lock()
+flush_tasks = set()
+
+# There is one active session at a time, so it has one checkpoint document.
+# The pod holding it renews a lease on every flush; other pods only adopt the
+# checkpoint once it has been released or the lease has run out.
+CHECKPOINT_ID = "activeSession"
+CHECKPOINT_LEASE_MS = max(3 * CHECKPOINT_INTERVAL_MS, int(os.getenv("CHECKPOINT_LEASE_MS", "15000")))
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
 security = HTTPBearer()
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -79,7 +100,177 @@ def require_student(current_user:dict=Depends(get_current_user)):
             detail="Forbidden student access required"
         )
     return current_user
-app=FastAPI()
+
+
+# Session checkpoint helpers
+def lease_expiry():
+    return datetime.utcnow() + timedelta(milliseconds=CHECKPOINT_LEASE_MS)
+
+
+def save_session_checkpoint(session: dict):
+    """Write the full session document, taking ownership of the checkpoint"""
+    session_checkpoints.replace_one(
+        {"_id": CHECKPOINT_ID},
+        {
+            "_id": CHECKPOINT_ID,
+            "classId": session["classId"],
+            "startedAt": session["startedAt"],
+            "attendance": dict(session["attendance"]),
+            "owner": INSTANCE_ID,
+            "leaseUntil": lease_expiry()
+        },
+        upsert=True
+    )
+
+
+def write_pending_marks(class_id: str, marks: dict):
+    """Apply buffered marks and renew the lease; False if another pod took over"""
+    update = {f"attendance.{student_id}": status for student_id, status in marks.items()}
+    update["leaseUntil"] = lease_expiry()
+    result = session_checkpoints.update_one(
+        {"_id": CHECKPOINT_ID, "classId": class_id, "owner": INSTANCE_ID},
+        {"$set": update}
+    )
+    return result.matched_count == 1
+
+
+def delete_session_checkpoint(class_id: str):
+    session_checkpoints.delete_one({"_id": CHECKPOINT_ID, "classId": class_id, "owner": INSTANCE_ID})
+
+
+def release_session_checkpoint():
+    """Hand the checkpoint over so another pod can adopt it straight away"""
+    session_checkpoints.update_one(
+        {"_id": CHECKPOINT_ID, "owner": INSTANCE_ID},
+        {"$set": {"owner": None, "leaseUntil": datetime.utcnow()}}
+    )
+
+
+def claim_session_checkpoint():
+    """Adopt the checkpoint if nobody else holds a live lease on it"""
+    checkpoint = session_checkpoints.find_one_and_update(
+        {
+            "_id": CHECKPOINT_ID,
+            "$or": [
+                {"owner": INSTANCE_ID},
+                {"owner": None},
+                {"leaseUntil": {"$lt": datetime.utcnow()}}
+            ]
+        },
+        {"$set": {"owner": INSTANCE_ID, "leaseUntil": lease_expiry()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not checkpoint:
+        return None
+    return {
+        "classId": checkpoint["classId"],
+        "startedAt": checkpoint["startedAt"],
+        "attendance": checkpoint.get("attendance", {})
+    }
+
+
+async def restore_active_session():
+    """Load a checkpointed session when this pod has none, e.g. after a scale-down"""
+    global activeSession
+
+    if activeSession:
+        return activeSession
+    async with checkpoint_lock:
+        if activeSession:
+            return activeSession
+        try:
+            activeSession = await asyncio.to_thread(claim_session_checkpoint)
+        except Exception as e:
+            print(f"Could not restore session checkpoint: {e}")
+            return None
+        if activeSession:
+            pending_marks.clear()
+            print(f"Restored attendance session for class {activeSession['classId']}")
+        return activeSession
+
+
+async def replace_active_session(session):
+    """Swap the active session, checkpointing it before it becomes visible"""
+    global activeSession
+
+    async with checkpoint_lock:
+        pending_marks.clear()
+        if session:
+            await asyncio.to_thread(save_session_checkpoint, session)
+        elif activeSession:
+            await asyncio.to_thread(delete_session_checkpoint, activeSession["classId"])
+        activeSession = session
+
+
+async def flush_pending_marks():
+    """Flush buffered marks for the active session and renew its lease"""
+    global activeSession
+
+    async with checkpoint_lock:
+        if not activeSession:
+            pending_marks.clear()
+            return
+        marks = dict(pending_marks)
+        pending_marks.clear()
+        try:
+            owned = await asyncio.to_thread(write_pending_marks, activeSession["classId"], marks)
+        except ConnectionFailure as e:
+            print(f"Checkpoint error: {e}")
+            # Keep the marks so the next flush retries them; newer marks win
+            for student_id, status in marks.items():
+                pending_marks.setdefault(student_id, status)
+            return
+        except Exception as e:
+            # Retrying a rejected write can never succeed and would stop the
+            # lease from being renewed, so drop the batch
+            print(f"Checkpoint error, dropping {len(marks)} marks: {e}")
+            return
+        if not owned:
+            print(f"Attendance session for class {activeSession['classId']} was taken over by another instance")
+            activeSession = None
+
+
+def schedule_flush():
+    """Flush in the background so a full batch never delays the broadcast"""
+    task = asyncio.create_task(flush_pending_marks())
+    flush_tasks.add(task)
+    task.add_done_callback(flush_tasks.discard)
+
+
+async def checkpoint_loop():
+    """Periodically flush buffered marks, or adopt a released session if idle"""
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL_MS / 1000)
+        if activeSession:
+            await flush_pending_marks()
+        else:
+            await restore_active_session()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Restore any session that was in progress when the previous pod stopped
+    await restore_active_session()
+
+    checkpoint_task = asyncio.create_task(checkpoint_loop())
+    try:
+        yield
+    finally:
+        # uvicorn has already closed every /ws connection with code 1012
+        # (service restart) by now, so only the checkpoint is left to save
+        checkpoint_task.cancel()
+        try:
+            await checkpoint_task
+        except asyncio.CancelledError:
+            pass
+        await flush_pending_marks()
+        try:
+            await asyncio.to_thread(release_session_checkpoint)
+        except Exception as e:
+            print(f"Could not release session checkpoint: {e}")
+
+
+app=FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def get():
@@ -300,12 +491,10 @@ def students(current_user:dict=Depends(require_teacher)):
 }
 
 @app.post("/attendance/start")
-def start_attendance(req: attendancestartReq, teacher: dict = Depends(require_teacher)):
- 
-    global activeSession
+async def start_attendance(req: attendancestartReq, teacher: dict = Depends(require_teacher)):
 
     # Find the class
-    class_doc = classes.find_one({"_id": ObjectId(req.classId)})
+    class_doc = await asyncio.to_thread(classes.find_one, {"_id": ObjectId(req.classId)})
     if not class_doc:
         raise HTTPException(
             status_code=404,
@@ -322,12 +511,12 @@ def start_attendance(req: attendancestartReq, teacher: dict = Depends(require_te
     # Create ISO timestamp
     started_at = datetime.utcnow().isoformat() + "Z"
 
-    # Set active session
-    activeSession = {
+    # Set active session, replacing any previous session and its checkpoint
+    await replace_active_session({
         "classId": req.classId,
         "startedAt": started_at,
         "attendance": {}
-    }
+    })
 
     return {
         "success": True,
@@ -439,7 +628,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
             return
 
         # Attach user info to websocket
-        websocket.user = {
+        websocket.state.user = {
             "userId": user_id,
             "role": user["role"]
         }
@@ -457,7 +646,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
                 # Handle different events
                 if event == "ATTENDANCE_MARKED":
                     # Teacher only
-                    if websocket.user["role"] != "teacher":
+                    if websocket.state.user["role"] != "teacher":
                         await send_error(websocket, "Forbidden, teacher event only")
                         continue
 
@@ -468,9 +657,19 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
                     student_id = event_data.get("studentId")
                     status = event_data.get("status")
 
+                    # The id becomes a field path in the checkpoint, so it must be a real ObjectId
+                    if not isinstance(student_id, str) or not ObjectId.is_valid(student_id):
+                        await send_error(websocket, "Invalid studentId")
+                        continue
+
                     # Update in-memory attendance
                     activeSession["attendance"][student_id] = status
 
+                    # Buffer the mark for write-behind checkpointing
+                    pending_marks[student_id] = status
+                    if len(pending_marks) >= CHECKPOINT_BATCH_SIZE:
+                        schedule_flush()
+
                     # Broadcast to all clients
                     await broadcast_message({
                         "event": "ATTENDANCE_MARKED",
@@ -482,7 +681,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
 
                 elif event == "TODAY_SUMMARY":
                     # Teacher only
-                    if websocket.user["role"] != "teacher":
+                    if websocket.state.user["role"] != "teacher":
                         await send_error(websocket, "Forbidden, teacher event only")
                         continue
 
@@ -508,7 +707,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
 
                 elif event == "MY_ATTENDANCE":
                     # Student only
-                    if websocket.user["role"] != "student":
+                    if websocket.state.user["role"] != "student":
                         await send_error(websocket, "Forbidden, student event only")
                         continue
 
@@ -517,7 +716,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
                         continue
 
                     # Get student's status
-                    student_status = activeSession["attendance"].get(websocket.user["userId"], "not yet updated")
+                    student_status = activeSession["attendance"].get(websocket.state.user["userId"], "not yet updated")
 
                     # Send to this student only (unicast)
                     await websocket.send_json({
@@ -529,7 +728,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
 
                 elif event == "DONE":
                     # Teacher only
-                    if websocket.user["role"] != "teacher":
+                    if websocket.state.user["role"] != "teacher":
                         await send_error(websocket, "Forbidden, teacher event only")
                         continue
 
@@ -579,11 +778,12 @@ async def websocket_endpoint(websocket: WebSocket, token: str = None):
                             }
                         })
 
-                        # Clear active session
-                        activeSession = None
+                        # Clear active session and its checkpoint
+                        await replace_active_session(None)
 
         except WebSocketDisconnect:
-            active_connections.remove(websocket)
+            if websocket in active_connections:
+                active_connections.remove(websocket)
         except Exception as e:
             print(f"WebSocket error: {e}")
             if websocket in active_connections:
@@ -0,0 +1,224 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+import jwt
+import mongomock
+import pymongo
+import pytest
+from fastapi.testclient import TestClient
+
+# main.py connects at import time, so swap in mongomock first
+pymongo.MongoClient = mongomock.MongoClient
+import main
+
+
+@pytest.fixture
+def seeded():
+    for collection in (main.users, main.classes, main.attendance_records, main.session_checkpoints):
+        collection.delete_many({})
+    main.activeSession = None
+    main.pending_marks.clear()
+
+    hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4))
+    teacher_id = main.users.insert_one(
+        {"name": "Teacher", "email": "teacher@example.com", "password": hashed, "role": "teacher"}
+    ).inserted_id
+    student_ids = main.users.insert_many([
+        {"name": f"Student {i}", "email": f"student{i}@example.com", "password": hashed, "role": "student"}
+        for i in range(3)
+    ]).inserted_ids
+    class_ids = main.classes.insert_many([
+        {"className": name, "teacherId": teacher_id, "studentIds": student_ids}
+        for name in ("Maths", "Physics")
+    ]).inserted_ids
+
+    token = jwt.encode({"email": "teacher@example.com", "id": str(teacher_id)}, "secret token", algorithm="HS256")
+    return {
+        "token": token,
+        "classIds": [str(cid) for cid in class_ids],
+        "studentIds": [str(sid) for sid in student_ids]
+    }
+
+
+def start_session(client, seeded, class_id):
+    res = client.post(
+        "/attendance/start",
+        json={"classId": class_id},
+        headers={"Authorization": f"Bearer {seeded['token']}"}
+    )
+    assert res.status_code == 200
+
+
+def mark(ws, student_id, status="present"):
+    ws.send_json({"event": "ATTENDANCE_MARKED", "data": {"studentId": student_id, "status": status}})
+    assert ws.receive_json()["event"] == "ATTENDANCE_MARKED"
+
+
+def summary(ws):
+    ws.send_json({"event": "TODAY_SUMMARY"})
+    return ws.receive_json()
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for checkpoint"
+        time.sleep(0.02)
+
+
+def checkpointed_attendance():
+    checkpoint = main.session_checkpoints.find_one({"_id": main.CHECKPOINT_ID})
+    return checkpoint and checkpoint["attendance"]
+
+
+def test_checkpoint_survives_restart(seeded):
+    class_id = seeded["classIds"][0]
+    student_id = seeded["studentIds"][0]
+
+    with TestClient(main.app) as client:
+        start_session(client, seeded, class_id)
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            mark(ws, student_id)
+
+    checkpoint = main.session_checkpoints.find_one({"_id": main.CHECKPOINT_ID})
+    assert checkpoint["classId"] == class_id
+    assert checkpoint["attendance"] == {student_id: "present"}
+    assert checkpoint["owner"] is None
+
+    main.activeSession = None
+    with TestClient(main.app):
+        assert main.activeSession["classId"] == class_id
+        assert main.activeSession["attendance"] == {student_id: "present"}
+
+
+def test_running_pod_adopts_released_checkpoint(seeded, monkeypatch):
+    monkeypatch.setattr(main, "CHECKPOINT_INTERVAL_MS", 50)
+    class_id = seeded["classIds"][0]
+
+    with TestClient(main.app) as client:
+        assert main.activeSession is None
+        # Another pod was scaled down and released its session
+        main.session_checkpoints.insert_one({
+            "_id": main.CHECKPOINT_ID,
+            "classId": class_id,
+            "startedAt": "2026-01-01T09:00:00Z",
+            "attendance": {seeded["studentIds"][0]: "present"},
+            "owner": None,
+            "leaseUntil": datetime.utcnow()
+        })
+        wait_until(lambda: main.activeSession is not None)
+
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            assert summary(ws) == {"event": "TODAY_SUMMARY", "data": {"present": 1, "absent": 0, "total": 1}}
+
+    assert main.session_checkpoints.find_one({"_id": main.CHECKPOINT_ID})["owner"] is None
+
+
+def test_live_lease_is_not_adopted(seeded):
+    main.session_checkpoints.insert_one({
+        "_id": main.CHECKPOINT_ID,
+        "classId": seeded["classIds"][0],
+        "startedAt": "2026-01-01T09:00:00Z",
+        "attendance": {},
+        "owner": "other-pod:1",
+        "leaseUntil": datetime.utcnow() + timedelta(minutes=5)
+    })
+
+    with TestClient(main.app) as client:
+        assert main.activeSession is None
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            assert summary(ws)["data"]["message"] == "No active attendance session"
+
+    assert main.session_checkpoints.find_one({"_id": main.CHECKPOINT_ID})["owner"] == "other-pod:1"
+
+
+def test_full_batch_flushes_while_connected(seeded, monkeypatch):
+    monkeypatch.setattr(main, "CHECKPOINT_BATCH_SIZE", 2)
+    first, second = seeded["studentIds"][:2]
+
+    with TestClient(main.app) as client:
+        start_session(client, seeded, seeded["classIds"][0])
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            mark(ws, first)
+            assert checkpointed_attendance() == {}
+            mark(ws, second, "absent")
+            wait_until(lambda: checkpointed_attendance() == {first: "present", second: "absent"})
+
+
+def test_interval_flushes_while_connected(seeded, monkeypatch):
+    monkeypatch.setattr(main, "CHECKPOINT_INTERVAL_MS", 50)
+    student_id = seeded["studentIds"][0]
+
+    with TestClient(main.app) as client:
+        start_session(client, seeded, seeded["classIds"][0])
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            mark(ws, student_id)
+            wait_until(lambda: checkpointed_attendance() == {student_id: "present"})
+
+
+def test_invalid_student_id_is_rejected(seeded):
+    with TestClient(main.app) as client:
+        start_session(client, seeded, seeded["classIds"][0])
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            for student_id in ("$bad", "a.b", None):
+                ws.send_json({"event": "ATTENDANCE_MARKED", "data": {"studentId": student_id, "status": "present"}})
+                assert ws.receive_json() == {"event": "ERROR", "data": {"message": "Invalid studentId"}}
+            assert main.activeSession["attendance"] == {}
+            assert main.pending_marks == {}
+            mark(ws, seeded["studentIds"][0])
+
+    assert checkpointed_attendance() == {seeded["studentIds"][0]: "present"}
+
+
+def test_rejected_write_does_not_block_later_flushes(seeded):
+    session = {"classId": seeded["classIds"][0], "startedAt": "2026-01-01T09:00:00Z", "attendance": {}}
+    asyncio.run(main.replace_active_session(session))
+
+    main.pending_marks["$bad"] = "present"
+    asyncio.run(main.flush_pending_marks())
+    assert main.pending_marks == {}
+
+    main.pending_marks[seeded["studentIds"][0]] = "present"
+    asyncio.run(main.flush_pending_marks())
+    assert checkpointed_attendance() == {seeded["studentIds"][0]: "present"}
+
+
+def test_new_session_replaces_checkpoint(seeded):
+    first, second = seeded["classIds"]
+
+    with TestClient(main.app) as client:
+        start_session(client, seeded, first)
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            mark(ws, seeded["studentIds"][0])
+        start_session(client, seeded, second)
+
+    checkpoints = list(main.session_checkpoints.find())
+    assert len(checkpoints) == 1
+    assert checkpoints[0]["classId"] == second
+    assert checkpoints[0]["attendance"] == {}
+
+
+def test_done_deletes_checkpoint(seeded):
+    with TestClient(main.app) as client:
+        start_session(client, seeded, seeded["classIds"][0])
+        with client.websocket_connect(f"/ws?token={seeded['token']}") as ws:
+            mark(ws, seeded["studentIds"][0])
+            ws.send_json({"event": "DONE"})
+            assert ws.receive_json()["data"]["total"] == 3
+
+    assert main.session_checkpoints.count_documents({}) == 0
+    assert main.attendance_records.count_documents({}) == 3
+
+
+def test_flush_drops_session_taken_over_by_another_pod(seeded):
+    session = {"classId": seeded["classIds"][0], "startedAt": "2026-01-01T09:00:00Z", "attendance": {}}
+    asyncio.run(main.replace_active_session(session))
+    main.session_checkpoints.update_one({"_id": main.CHECKPOINT_ID}, {"$set": {"owner": "other-pod:1"}})
+
+    main.pending_marks[seeded["studentIds"][0]] = "present"
+    asyncio.run(main.flush_pending_marks())
+
+    assert main.activeSession is None
+    assert main.session_checkpoints.find_one({"_id": main.CHECKPOINT_ID})["attendance"] == {}